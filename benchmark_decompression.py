@@ -0,0 +1,62 @@
+###############################################################################
+# Benchmark the gzip decompression backends on Met Office radar archives
+# Reports the decompressed MB/s of each installed backend, so that a backend
+# can be chosen per deployment (DECOMPRESSION_BACKEND)
+#
+#   python benchmark_decompression.py <archive.dat.gz.tar> [...]
+###############################################################################
+
+###############################################################################
+# Python libraries
+###############################################################################
+import argparse
+import tarfile
+import time
+import decompress
+
+
+###############################################################################
+# Helper functions
+###############################################################################
+
+# Function to read the gzip members of the daily archives into memory
+def read_members(tar_files):
+    members = []
+    for tf in tar_files:
+        with tarfile.open(tf) as tar:
+            for member in tar.getmembers():
+                if member.name.endswith(".gz"):
+                    members.append(tar.extractfile(member).read())
+    return members
+
+# Function to time a backend, returning the decompressed MB/s
+def benchmark(backend, members, repeats):
+    n_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for data in members:
+            n_bytes += len(backend.decompress(data))
+    return n_bytes / 1e6 / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    """
+    Main function
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the gzip decompression backends")
+    parser.add_argument("tar_files", nargs="+", help="daily Met Office radar archives (.dat.gz.tar)")
+    parser.add_argument("-n", "--repeats", type=int, default=3, help="number of passes over the archives")
+    args = parser.parse_args()
+
+    members = read_members(args.tar_files)
+    print("{} gzip members, {:.1f} MB compressed".format(
+        len(members), sum(len(m) for m in members) / 1e6))
+
+    for name in decompress.BACKENDS:
+        try:
+            backend = decompress.get_backend(name)
+        except ImportError:
+            print("{:>8}: not installed".format(name))
+            continue
+        print("{:>8}: {:.1f} MB/s".format(name, benchmark(backend, members, args.repeats)))
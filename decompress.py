@@ -0,0 +1,101 @@
+###############################################################################
+# Pluggable gzip decompression backends for the Met Office radar archives
+# The stdlib zlib backend is always available; isal is used only if installed
+###############################################################################
+
+###############################################################################
+# Python libraries
+###############################################################################
+import zlib
+
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+DEFAULT_BACKEND = "zlib"
+
+# zlib window bits for a gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+###############################################################################
+# Backends
+###############################################################################
+
+class DecompressionBackend:
+    """Gzip decompression using a module with the stdlib zlib interface."""
+
+    def __init__(self, name, zlib_module):
+        """
+        Args:
+            name: backend name
+            zlib_module: module providing decompress() and decompressobj()
+        """
+        self.name = name
+        self.zlib = zlib_module
+
+    def decompress(self, data):
+        """
+        Inflate a complete gzip file held in memory, member by member.
+
+        Each member is inflated in one call. The output buffer is not
+        preallocated from the gzip trailer size: only decompressobj() reports
+        where a member ends (and so whether further members follow), and it
+        does not accept a buffer size.
+
+        Args:
+            data: gzip compressed bytes
+        Returns:
+            decompressed bytes
+        """
+
+        members = []
+        while data:
+            d = self.zlib.decompressobj(GZIP_WBITS)
+            members.append(d.decompress(data))
+            if not d.eof:
+                raise self.zlib.error("Incomplete gzip member")
+            # Skip any zero padding before the next member
+            data = d.unused_data.lstrip(b"\x00")
+
+        # A single member (the usual case) is returned without a copy
+        if len(members) == 1:
+            return members[0]
+        return b"".join(members)
+
+
+# Functions to import the zlib compatible module of each backend
+def _import_zlib():
+    return zlib
+
+def _import_isal():
+    from isal import isal_zlib
+    return isal_zlib
+
+BACKENDS = {
+    "zlib": _import_zlib,
+    "isal": _import_isal,
+}
+
+
+###############################################################################
+# Helper functions
+###############################################################################
+
+# Function to get a decompression backend by name
+def get_backend(name=DEFAULT_BACKEND):
+    """
+    Args:
+        name: backend name, one of BACKENDS
+    Returns:
+        DecompressionBackend
+    Raises:
+        ValueError: unknown backend name
+        ImportError: the backend's library is not installed
+    """
+
+    if name not in BACKENDS:
+        raise ValueError("Unknown decompression backend {} (expected one of {})".format(
+            name, ", ".join(BACKENDS)))
+    return DecompressionBackend(name, BACKENDS[name]())
+
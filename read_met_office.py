@@ -14,12 +14,14 @@ import os
 import numpy as np
 import pandas as pd
 import ftplib
-import gzip
+import io
 import tarfile
 import shutil
 import tqdm
 import pathlib
 import logging
+import json
+import decompress
 
 
 ###############################################################################
@@ -27,6 +29,7 @@ import logging
 ###############################################################################
 MET_SUCCESS_FILENAME = "success"
 MET_LOG_FILENAME = "read_met_office.log"
+MET_CHECKPOINT_FILENAME = "checkpoint.json"
 
 
 ###############################################################################
@@ -52,9 +55,12 @@ output_path_15min = os.path.join(output_path, "15min")
 os.makedirs(output_path_15min, exist_ok=True)
 
 # Reset the success and log files (if e.g. running locally)
+# If a checkpoint exists a previous run was interrupted, so the log is kept
+# and appended to rather than deleted
 if os.path.isfile(os.path.join(output_path, MET_SUCCESS_FILENAME)):
     os.remove(os.path.join(output_path, MET_SUCCESS_FILENAME))
-if os.path.isfile(os.path.join(output_path, MET_LOG_FILENAME)):
+if os.path.isfile(os.path.join(output_path, MET_LOG_FILENAME)) and \
+        not os.path.isfile(os.path.join(output_path, MET_CHECKPOINT_FILENAME)):
     os.remove(os.path.join(output_path, MET_LOG_FILENAME))
 
 
@@ -115,6 +121,15 @@ except (TypeError, ValueError, Exception) as e:
     logger.error("Error converting environmental parameters: {}".format(e))
     raise
 
+# Decompression backend for the archived radar files
+# Falls back to the stdlib zlib backend if the requested one is not installed
+try:
+    decompressor = decompress.get_backend(os.getenv("DECOMPRESSION_BACKEND", decompress.DEFAULT_BACKEND))
+except ImportError as e:
+    logger.warning("Decompression backend not installed ({}), using {}".format(e, decompress.DEFAULT_BACKEND))
+    decompressor = decompress.get_backend(decompress.DEFAULT_BACKEND)
+logger.info("decompression backend = {}".format(decompressor.name))
+
 
 
 ##########################  MET OFFICE NIMROD CODE  ###########################
@@ -466,60 +481,145 @@ def get_filenames(date_start, date_end, format='%Y-%m-%d %H:%M:%S'):
     
     return file_names, years
     
-# Function to extract data
-def extract(file_from, bbox):
-    
-    tar_files = [os.path.join(file_from, ff) for ff in os.listdir(file_from) if ff.endswith(".tar")]
-    
-    if len(tar_files) > 0:
-        
-        dates = []
-        arrs = []
-
-        for tf in tqdm.tqdm(tar_files):
-
-            with tarfile.open(tf) as tar:
-                tar.extractall(file_from)
-
-                gz_files = [os.path.join(file_from, ff) for ff in os.listdir(file_from) if ff.endswith(".gz")]
-
-                for g in tqdm.tqdm(gz_files):
-                    with gzip.open(g, 'rb') as f_in:
-                        with open(os.path.splitext(g)[0], 'wb') as f_out:
-                            shutil.copyfileobj(f_in, f_out)
-
-                dat_files = [ff for ff in os.listdir(file_from) if ff.endswith(".dat")]
-
-                for df in tqdm.tqdm(dat_files):
-                    try:
-                        nf = nimrod_file(os.path.join(file_from, df), 
-                                    #os.path.join(file_to, df.split(".")[0] + ".asc"), 
-                                    bbox=bbox)#, 
-                                    #extract=True)
-                            
-                        xs = pd.Series(np.linspace(nf.x_left, nf.x_right, nf.ncols))
-                        ys = pd.Series(np.linspace(nf.y_bottom, nf.y_top, nf.nrows))
-                        dates.append(pd.to_datetime(df.split("_")[-2]))
-                        arrs.append(np.array(nf.data).reshape(nf.nrows, nf.ncols))
-                    except:
-                        #raise Exception("Extraction failed for ", df)
-                        logger.error("Extraction failed for {}".format(df))
+# Function to get the date string (YYYYMMDD) from a daily file name
+def get_file_date(file_name):
+    return file_name.split('_')[2]
+
+# Function to read the checkpoint manifest, starting afresh if the run
+# parameters differ from those the manifest was written with
+def read_checkpoint(checkpoint_file, parameters):
+
+    if os.path.isfile(checkpoint_file):
+        with open(checkpoint_file, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("parameters") == parameters:
+            return checkpoint
+        logger.info("Checkpoint parameters differ from this run, starting afresh")
+
+    return {"parameters": parameters, "days": {}, "written": False}
+
+# Function to write the checkpoint manifest (atomic rename-on-complete)
+def write_checkpoint(checkpoint_file, checkpoint):
+
+    with open(checkpoint_file + ".part", 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(checkpoint_file + ".part", checkpoint_file)
+
+# Function to extract data from a single daily archive
+# Each gzip member is inflated in memory and read directly, without writing
+# the compressed or decompressed files to disk
+def extract(tar_file, bbox):
+
+    dates = []
+    arrs = []
+    xs = None
+    ys = None
+
+    with tarfile.open(tar_file) as tar:
+        gz_members = sorted([m for m in tar.getmembers() if m.name.endswith(".gz")], key=lambda m: m.name)
+
+        for member in tqdm.tqdm(gz_members):
+            df = os.path.splitext(os.path.basename(member.name))[0]
+            try:
+                nf = Nimrod(io.BytesIO(decompressor.decompress(tar.extractfile(member).read())))
+                nf.apply_bbox(bbox[0], bbox[1], bbox[2], bbox[3])
+                    
+                xs = np.linspace(nf.x_left, nf.x_right, nf.ncols)
+                ys = np.linspace(nf.y_bottom, nf.y_top, nf.nrows)
+                dates.append(pd.to_datetime(df.split("_")[-2]))
+                arrs.append(np.array(nf.data, dtype=np.int16).reshape(nf.nrows, nf.ncols))
+            except (Nimrod.RecordLenError, Nimrod.HeaderReadError, Nimrod.PayloadReadError,
+                    Nimrod.BboxRangeError, EOFError, decompressor.zlib.error):
+                # Only a corrupt file is skipped; any other error propagates so
+                # that the day is not checkpointed and is decoded again on restart
+                #raise Exception("Extraction failed for ", df)
+                logger.error("Extraction failed for {}".format(df))
 
     return [dates, arrs, xs, ys]
 
+# Function to save the clipped data for one day (atomic rename-on-complete)
+def save_day(day_file, dates, arrs, xs, ys):
+
+    with open(day_file + ".part", 'wb') as f:
+        np.savez(f,
+                 dates=np.array(dates, dtype="datetime64[ns]"),
+                 arrays=np.array(arrs, dtype=np.int16),
+                 xs=xs,
+                 ys=ys)
+    os.replace(day_file + ".part", day_file)
+
+# Function to write the outputs from the daily checkpoint files, one day at a
+# time so that the full period is never held in memory
+def write_outputs(folder_path, day_files):
+
+    n_times = 0
+    for day_file in day_files:
+        with np.load(day_file) as day:
+            if day["dates"].shape[0] > 0:
+                n_times += day["dates"].shape[0]
+                xs = day["xs"]
+                ys = day["ys"]
+    if n_times == 0:
+        raise RuntimeError("No radar data was extracted")
+
+    arrays_file = os.path.join(folder_path, "arrays.npy")
+    arrays = np.lib.format.open_memmap(
+        arrays_file + ".part", mode="w+", dtype=np.float64,
+        shape=(n_times, ys.shape[0], xs.shape[0]))
+    dates = []
+    i = 0
+    for day_file in day_files:
+        with np.load(day_file) as day:
+            n = day["dates"].shape[0]
+            if n > 0:
+                arrays[i:i + n] = day["arrays"] / 32
+                dates.extend(pd.to_datetime(day["dates"]))
+                i += n
+    arrays.flush()
+    del arrays
+    os.replace(arrays_file + ".part", arrays_file)
+
+    # Save data (horrible way to save it)
+    pd.Series(dates).to_csv(os.path.join(folder_path, "timestamp.csv"), index=False)
+    pd.Series(xs).to_csv(os.path.join(folder_path, "coords_x.csv"), index=False)
+    pd.Series(ys).to_csv(os.path.join(folder_path, "coords_y.csv"), index=False)
+
 # Function to get data (note: shouldn't be ran for a long time - uses up a lot of storage in temp folder)
+# Progress is recorded per day in a checkpoint manifest, so that a run which
+# is restarted with the same parameters skips the days already completed
 def download(start_date, end_date, folder_path, bbox, delete=True):
-    
+
+    # Read any checkpoint left by an interrupted run
+    checkpoint_file = os.path.join(folder_path, MET_CHECKPOINT_FILENAME)
+    parameters = {
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "bbox": [int(b) for b in bbox],
+    }
+    checkpoint = read_checkpoint(checkpoint_file, parameters)
+    if checkpoint["written"]:
+        logger.info("Outputs already written by a previous run")
+        return
+    write_checkpoint(checkpoint_file, checkpoint)
+
     # If new directory doesn't exist make it
     temp_dir = os.path.join(folder_path, "temp")
     if not os.path.isdir(temp_dir):
         os.mkdir(temp_dir)
-    
+
     # Get file names to download 
     file_names, years = get_filenames(start_date, end_date)
+    days = checkpoint["days"]
+    n_done = sum(1 for file in file_names if days.get(get_file_date(file)) == "decoded")
+    if n_done > 0:
+        logger.info("Resuming from checkpoint: {} of {} days already completed".format(n_done, len(file_names)))
     
     for year in tqdm.tqdm(list(set(years))):
         file_dir = BAD_PATH_FIXME + str(year) + '/'
+        year_files = [file for file in np.array(file_names)[years == year]
+                      if get_file_date(file) not in days]
+        if len(year_files) == 0:
+            continue
 
         # login to FTP
         f = ftplib.FTP(CEDA_FTP_URL, username, password)
@@ -527,23 +627,55 @@ def download(start_date, end_date, folder_path, bbox, delete=True):
         # Directory of files to save
         f.cwd(file_dir)
 
-        for file in tqdm.tqdm(np.array(file_names)[years == year]):
+        for file in tqdm.tqdm(year_files):
             
             try:
                 # Copies data from ftp server
-                f.retrbinary("RETR %s" % file, open(os.path.join(temp_dir, file), "wb").write)
-            except:
-                logger.error("Download failed for {}".format(file))
+                with open(os.path.join(temp_dir, file + ".part"), "wb") as f_out:
+                    f.retrbinary("RETR %s" % file, f_out.write)
+                os.replace(os.path.join(temp_dir, file + ".part"), os.path.join(temp_dir, file))
+                days[get_file_date(file)] = "downloaded"
+                write_checkpoint(checkpoint_file, checkpoint)
+            except ftplib.error_perm as e:
+                # Permanent error, i.e. the file is not on the server
+                logger.error("Download failed for {}, not retrying: {}".format(file, e))
+                days[get_file_date(file)] = "missing"
+                write_checkpoint(checkpoint_file, checkpoint)
+            except ftplib.all_errors as e:
+                # Connection or temporary error, retried when the run is restarted
+                logger.error("Download failed for {}: {}".format(file, e))
                 #raise Exception("Download failed for ", file)
-                
-    # Extracts and clips data
-    dates, arrs, xs, ys = extract(temp_dir, bbox)
-    
-    # Save data (horrible way to save it)
-    pd.Series(dates).to_csv(os.path.join(folder_path, "timestamp.csv"), index=False)
-    np.save(os.path.join(folder_path, "arrays.npy"), np.array(arrs) / 32)
-    xs.to_csv(os.path.join(folder_path, "coords_x.csv"), index=False)
-    ys.to_csv(os.path.join(folder_path, "coords_y.csv"), index=False)
+
+    # Extracts and clips data, one day at a time
+    day_files = []
+    for file in tqdm.tqdm(file_names):
+        date = get_file_date(file)
+        day_file = os.path.join(temp_dir, date + ".npz")
+
+        if days.get(date) == "downloaded":
+            dates, arrs, xs, ys = extract(os.path.join(temp_dir, file), bbox)
+            save_day(day_file, dates, arrs, xs, ys)
+            days[date] = "decoded"
+            write_checkpoint(checkpoint_file, checkpoint)
+
+            if delete:
+                os.remove(os.path.join(temp_dir, file))
+
+        if days.get(date) == "decoded":
+            day_files.append(day_file)
+
+    # Stop before writing the outputs if any day could still be downloaded,
+    # so that a restart picks it up rather than it being left out
+    incomplete = [get_file_date(file) for file in file_names
+                  if days.get(get_file_date(file)) not in ("decoded", "missing")]
+    if len(incomplete) > 0:
+        raise RuntimeError("Download incomplete for {} day(s) ({}), restart the run to retry".format(
+            len(incomplete), ", ".join(incomplete)))
+
+    # Save data
+    write_outputs(folder_path, day_files)
+    checkpoint["written"] = True
+    write_checkpoint(checkpoint_file, checkpoint)
     
     if delete:
         shutil.rmtree(temp_dir)
@@ -563,7 +695,7 @@ if __name__ == "__main__":
 
     # Change temporal resolution of data
     timestamp_series = pd.to_datetime(pd.read_csv(os.path.join(output_path, "timestamp.csv"))["0"], utc=True)
-    arrs = np.load(os.path.join(output_path, "arrays.npy"))
+    arrs = np.load(os.path.join(output_path, "arrays.npy"), mmap_mode="r")
 
     # New data resolution in seconds
     delta_t = str(15*60) + "s"
@@ -578,7 +710,12 @@ if __name__ == "__main__":
         tz="UTC"
     )
 
-    new_arrays = np.full((new_timestamp.shape[0], arrs.shape[1], arrs.shape[2]), np.nan)
+    # Both cubes are memory mapped, so the full period is not held in memory
+    new_arrays_file = os.path.join(output_path_15min, "arrays.npy")
+    new_arrays = np.lib.format.open_memmap(
+        new_arrays_file + ".part", mode="w+", dtype=np.float64,
+        shape=(new_timestamp.shape[0], arrs.shape[1], arrs.shape[2]))
+    new_arrays[:] = np.nan
 
     for i, t in enumerate(new_timestamp):
         cond = (timestamp_series >= t) & (timestamp_series < t + pd.Timedelta(delta_t))
@@ -593,6 +730,11 @@ if __name__ == "__main__":
     ys.to_csv(os.path.join(output_path_15min, "coords_y.csv"), index=False)
 
     pd.Series(new_timestamp).to_csv(os.path.join(output_path_15min, "timestamp.csv"), index=False)
-    np.save(os.path.join(output_path_15min, "arrays.npy"), new_arrays)
+    new_arrays.flush()
+    del new_arrays
+    os.replace(new_arrays_file + ".part", new_arrays_file)
+
+    os.system("cd " + output_path + "; touch " + MET_SUCCESS_FILENAME)
 
-    os.system("cd " + output_path + "; touch " + MET_SUCCESS_FILENAME)
\ No newline at end of file
+    # The run is complete, so the checkpoint is no longer needed
+    os.remove(os.path.join(output_path, MET_CHECKPOINT_FILENAME))
\ No newline at end of file
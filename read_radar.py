@@ -0,0 +1,194 @@
+###############################################################################
+# Windowed reading of the radar rainfall outputs written by read_met_office.py
+# The stored cube is memory mapped, so only the requested window is read
+###############################################################################
+
+###############################################################################
+# Python libraries
+###############################################################################
+import os
+import numpy as np
+import pandas as pd
+
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+ARRAYS_FILENAME = "arrays.npy"
+TIMESTAMP_FILENAME = "timestamp.csv"
+COORDS_X_FILENAME = "coords_x.csv"
+COORDS_Y_FILENAME = "coords_y.csv"
+
+# Tolerance (in pixels) when converting coordinates to pixel offsets
+PIXEL_TOLERANCE = 1e-6
+
+
+###############################################################################
+# Radar cube
+###############################################################################
+
+class RadarCube:
+    """Radar rainfall data (t, y, x) with its timestamps and grid coordinates."""
+
+    def __init__(self, data, time, x, y):
+        """
+        Args:
+            data: array (or memory map) of radar data, indexed (t, y, x)
+            time: sorted UTC pandas DatetimeIndex of each time step
+            x: easting of each column (ascending)
+            y: northing of each row (descending, the first row is most north)
+        """
+        self.data = data
+        self.time = time
+        self.x = x
+        self.y = y
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def values(self):
+        """Read the data into memory as a numpy array."""
+        return np.array(self.data)
+
+    def sel(self, time=None, x=None, y=None):
+        """
+        Select a window of the radar data by timestamp and coordinates.
+
+        Time bounds follow pandas label slicing: they are inclusive, and a
+        partial date string selects its whole period (e.g. a stop of
+        "2023-06-20" selects to the end of that day). Timestamps without a
+        timezone are taken to be UTC. Coordinate bounds may be given in either
+        order, and select all pixels whose centres lie within them. No data is
+        read until the values of the returned window are used.
+
+        Args:
+            time: slice of timestamps (anything pandas.Timestamp accepts)
+            x: slice of eastings
+            y: slice of northings
+        Returns:
+            RadarCube of the selected window
+        Raises:
+            TypeError: a selection is not a slice, or has a step
+        """
+
+        for name, s in (("time", time), ("x", x), ("y", y)):
+            if s is not None and not isinstance(s, slice):
+                raise TypeError("{} selection must be a slice, e.g. slice(start, stop), not {}".format(
+                    name, type(s).__name__))
+            if s is not None and s.step is not None:
+                raise TypeError("{} selection must be a slice without a step".format(name))
+
+        t0, t1 = self._time_indices(time)
+        x0, x1 = self._x_indices(x)
+        y0, y1 = self._y_indices(y)
+
+        return RadarCube(
+            self.data[t0:t1, y0:y1, x0:x1],
+            self.time[t0:t1],
+            self.x[x0:x1],
+            self.y[y0:y1])
+
+    def _time_indices(self, time):
+        if time is None:
+            return 0, self.time.shape[0]
+
+        # Binary search of the (sorted) timestamps, resolving partial date
+        # strings as pandas does
+        indices = self.time.slice_indexer(_to_utc(time.start), _to_utc(time.stop))
+        start = int(indices.start or 0)
+        stop = self.time.shape[0] if indices.stop is None else int(indices.stop)
+        return start, max(start, stop)
+
+    def _x_indices(self, x):
+        if x is None:
+            return 0, self.x.shape[0]
+
+        # Pixel offsets from the left-most pixel centre
+        return _pixel_range(x, self.x[0], _pixel_size(self.x), self.x.shape[0])
+
+    def _y_indices(self, y):
+        if y is None:
+            return 0, self.y.shape[0]
+
+        # Pixel offsets from the top (most north) pixel centre
+        lower, upper = _bounds(y)
+        return _pixel_range(
+            slice(-upper, -lower), -self.y[0], _pixel_size(self.y), self.y.shape[0])
+
+
+###############################################################################
+# Helper functions
+###############################################################################
+
+# Function to convert a timestamp bound to UTC (strings are left for pandas
+# to parse, so that partial dates select their whole period)
+def _to_utc(timestamp):
+    if timestamp is None or isinstance(timestamp, str):
+        return timestamp
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+# Function to get the (lower, upper) bounds of a coordinate slice
+def _bounds(s):
+    lower = -np.inf if s.start is None else s.start
+    upper = np.inf if s.stop is None else s.stop
+    return min(lower, upper), max(lower, upper)
+
+# Function to get the pixel size of a regular grid of pixel centres
+def _pixel_size(coords):
+    if coords.shape[0] < 2:
+        return 1.0
+    return abs(coords[1] - coords[0])
+
+# Function to get the range of pixels with centres inside a coordinate slice
+def _pixel_range(s, origin, pixel_size, n):
+    lower, upper = _bounds(s)
+    start = np.ceil((lower - origin) / pixel_size - PIXEL_TOLERANCE)
+    stop = np.floor((upper - origin) / pixel_size + PIXEL_TOLERANCE) + 1
+    start = int(np.clip(start, 0, n))
+    stop = int(np.clip(stop, 0, n))
+    return start, max(start, stop)
+
+# Function to read a single column csv as written by pandas.Series.to_csv
+def _read_column(file_path):
+    return pd.read_csv(file_path).iloc[:, 0]
+
+
+###############################################################################
+# Open stored outputs
+###############################################################################
+
+def open_radar(path):
+    """
+    Open radar data stored by read_met_office.py without reading the arrays.
+
+    Args:
+        path: output folder, e.g. outputs/MET or outputs/MET/15min
+    Returns:
+        RadarCube backed by a memory map of the stored arrays
+    Raises:
+        ValueError: the stored timestamps are not in time order
+    """
+
+    data = np.load(os.path.join(path, ARRAYS_FILENAME), mmap_mode="r")
+
+    time = pd.DatetimeIndex(pd.to_datetime(_read_column(os.path.join(path, TIMESTAMP_FILENAME)), utc=True)).rename(None)
+
+    # Time selection is a binary search, so the timestamps must be sorted
+    # (outputs written before the daily checkpoints may not be)
+    if not time.is_monotonic_increasing:
+        raise ValueError("Timestamps in {} are not in time order".format(
+            os.path.join(path, TIMESTAMP_FILENAME)))
+
+    x = _read_column(os.path.join(path, COORDS_X_FILENAME)).to_numpy()
+    y = _read_column(os.path.join(path, COORDS_Y_FILENAME)).to_numpy()
+
+    # Coordinates are stored ascending, but the first row of data is most north
+    x = np.sort(x)
+    y = np.sort(y)[::-1]
+
+    return RadarCube(data, time, x, y)
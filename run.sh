@@ -23,7 +23,13 @@ export DATA_PATH=${DATA_PATH:=${DATA_ROOT}data}
 INPUTS=${DATA_PATH}/inputs
 OUTPUTS=${DATA_PATH}/outputs
 
-$DEBUG rm -r ${OUTPUTS}
+# Keep the outputs of an interrupted run so that it can resume from its checkpoint
+if [ -f "${OUTPUTS}/MET/checkpoint.json" ];
+then
+    echo "Resuming from checkpoint ${OUTPUTS}/MET/checkpoint.json";
+else
+    $DEBUG rm -r ${OUTPUTS}
+fi
 
 python -u read_met_office.py
 python -u write_output_metadata.py
@@ -0,0 +1,53 @@
+###############################################################################
+# Tests for the gzip decompression backends
+#   python -m pytest test_decompress.py
+###############################################################################
+import gzip
+import pytest
+import decompress
+
+
+def installed_backends():
+    backends = []
+    for name in decompress.BACKENDS:
+        try:
+            backends.append(decompress.get_backend(name))
+        except ImportError:
+            pass
+    return backends
+
+
+@pytest.fixture(params=installed_backends(), ids=lambda backend: backend.name)
+def backend(request):
+    return request.param
+
+
+def test_single_member(backend):
+    data = bytes(range(256)) * 1000
+    assert backend.decompress(gzip.compress(data)) == data
+
+
+def test_equal_size_members(backend):
+    # The second member's trailer size matches the first member's length
+    data = gzip.compress(b"A" * 100) + gzip.compress(b"B" * 100)
+    assert backend.decompress(data) == b"A" * 100 + b"B" * 100
+
+
+def test_members_with_padding(backend):
+    data = gzip.compress(b"abc") + b"\x00" * 8 + gzip.compress(b"defgh") + b"\x00" * 4
+    assert backend.decompress(data) == b"abcdefgh"
+
+
+def test_empty_member(backend):
+    assert backend.decompress(gzip.compress(b"")) == b""
+
+
+def test_truncated_member(backend):
+    data = gzip.compress(bytes(range(256)) * 1000)
+    with pytest.raises(backend.zlib.error):
+        backend.decompress(data[:len(data) // 2])
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        decompress.get_backend("unknown")
@@ -0,0 +1,116 @@
+###############################################################################
+# Tests for windowed reading of the stored radar outputs
+#   python -m pytest test_read_radar.py
+###############################################################################
+import numpy as np
+import pandas as pd
+import pytest
+from read_radar import open_radar
+
+
+# Times either side of midnight, and a 4 x 3 grid of 1 km pixels
+TIMES = pd.date_range("2023-06-20 23:50", periods=6, freq="5min")
+XS = np.array([0.0, 1000.0, 2000.0, 3000.0])
+YS = np.array([0.0, 1000.0, 2000.0])
+
+
+def write_outputs(path, times=TIMES, xs=XS, ys=YS):
+    """Write outputs as read_met_office.py does, with value t*100 + row*10 + col."""
+    t, row, col = np.meshgrid(np.arange(len(times)), np.arange(len(ys)), np.arange(len(xs)), indexing="ij")
+    arrays = (t * 100 + row * 10 + col).astype(np.float64)
+    np.save(path / "arrays.npy", arrays)
+    pd.Series(times).to_csv(path / "timestamp.csv", index=False)
+    pd.Series(xs).to_csv(path / "coords_x.csv", index=False)
+    pd.Series(ys).to_csv(path / "coords_y.csv", index=False)
+    return arrays
+
+
+@pytest.fixture
+def radar(tmp_path):
+    write_outputs(tmp_path)
+    return open_radar(tmp_path)
+
+
+def test_open_is_memory_mapped(radar):
+    assert isinstance(radar.data, np.memmap)
+    assert radar.shape == (6, 3, 4)
+    np.testing.assert_array_equal(radar.x, XS)
+    # The first row of data is most north
+    np.testing.assert_array_equal(radar.y, YS[::-1])
+
+
+def test_window_values(tmp_path):
+    arrays = write_outputs(tmp_path)
+    window = open_radar(tmp_path).sel(time=slice("2023-06-21 00:00", "2023-06-21 00:05"),
+                                      x=slice(1000, 2000), y=slice(1000, 2000))
+    np.testing.assert_array_equal(window.values, arrays[2:4, 0:2, 1:3])
+    np.testing.assert_array_equal(window.x, [1000, 2000])
+    np.testing.assert_array_equal(window.y, [2000, 1000])
+
+
+def test_y_rows_run_north_to_south(radar):
+    window = radar.sel(y=slice(2000, 2000))
+    np.testing.assert_array_equal(window.y, [2000])
+    np.testing.assert_array_equal(window.values[0, :, 0], [0])
+
+    window = radar.sel(y=slice(500, 1500))
+    np.testing.assert_array_equal(window.y, [1000])
+    np.testing.assert_array_equal(window.values[0, :, 0], [10])
+
+
+def test_bounds_in_either_order(radar):
+    np.testing.assert_array_equal(radar.sel(x=slice(2000, 1000)).x, [1000, 2000])
+    np.testing.assert_array_equal(radar.sel(y=slice(0, 1000)).y, [1000, 0])
+    np.testing.assert_array_equal(radar.sel(y=slice(1000, 0)).y, [1000, 0])
+
+
+def test_pixel_tolerance(radar):
+    # Bounds within the tolerance of a pixel centre include that pixel
+    np.testing.assert_array_equal(radar.sel(x=slice(1000.0005, 1999.9995)).x, [1000, 2000])
+    # Bounds between pixel centres include neither neighbour
+    assert radar.sel(x=slice(1000.5, 1999.5)).shape == (6, 3, 0)
+
+
+def test_clipped_to_grid(radar):
+    np.testing.assert_array_equal(radar.sel(x=slice(-5000, 500)).x, [0])
+    np.testing.assert_array_equal(radar.sel(y=slice(1500, 9000)).y, [2000])
+    assert radar.sel(x=slice(10000, 20000)).shape == (6, 3, 0)
+    assert radar.sel(y=slice(-9000, -5000)).shape == (6, 0, 4)
+    np.testing.assert_array_equal(radar.sel(x=slice(None, 1000)).x, [0, 1000])
+
+
+def test_single_pixel_grid(tmp_path):
+    write_outputs(tmp_path, xs=np.array([5000.0]), ys=np.array([7000.0]))
+    radar = open_radar(tmp_path)
+    assert radar.sel(x=slice(4000, 6000), y=slice(6000, 8000)).shape == (6, 1, 1)
+    assert radar.sel(x=slice(5500, 6000)).shape == (6, 1, 0)
+
+
+def test_time_bounds_inclusive(radar):
+    window = radar.sel(time=slice("2023-06-20 23:55", "2023-06-21 00:05"))
+    assert list(window.time) == list(TIMES[1:4].tz_localize("UTC"))
+
+
+def test_time_partial_date(radar):
+    # As in pandas, a partial date selects its whole period
+    assert radar.sel(time=slice("2023-06-20", "2023-06-20")).shape[0] == 2
+    assert radar.sel(time=slice("2023-06-21", None)).shape[0] == 4
+
+
+def test_time_zones(radar):
+    # Naive timestamps are UTC, aware timestamps are converted to UTC
+    assert radar.sel(time=slice(pd.Timestamp("2023-06-21 00:00"), None)).shape[0] == 4
+    assert radar.sel(time=slice(pd.Timestamp("2023-06-21 01:00", tz="Europe/London"), None)).shape[0] == 4
+
+
+def test_unsorted_timestamps(tmp_path):
+    write_outputs(tmp_path, times=TIMES[::-1])
+    with pytest.raises(ValueError):
+        open_radar(tmp_path)
+
+
+def test_selection_must_be_slice(radar):
+    with pytest.raises(TypeError):
+        radar.sel(time="2023-06-21 00:00")
+    with pytest.raises(TypeError):
+        radar.sel(x=slice(0, 3000, 2))